@@ -22,8 +22,7 @@
 
 import pandas as pd
 import numpy as np
-from scipy.signal import savgol_filter as savgol
-from functools import reduce
+from scipy.ndimage import convolve1d, maximum_filter1d, minimum_filter1d
 import warnings
 from flagit.settings import Variables
 
@@ -36,6 +35,325 @@ class VariableNotKnown(Exception):
 
 t = Variables()
 
+# Savitzky-Golay convolution coefficients (window length 3, polyorder 2) of the 1st and 2nd derivative. Values of
+# scipy.signal.savgol_coeffs(3, 2, deriv=1) and (3, 2, deriv=2) including their rounding errors. Interface.apply_savgol
+# applies them with scipy.ndimage.convolve1d like scipy.signal.savgol_filter, so the derivatives are identical to
+# those of savgol_filter without importing scipy.signal
+SAVGOL_COEFFS = np.array([
+    [0.5000000000000001, -5.551115123125783e-17, -0.5],
+    [1.0000000000000002, -2.0000000000000004, 0.9999999999999998],
+])
+
+# Flag numbers, bit n of the qflag bitmask is set when the flag with number n applies
+# (the highest flag number must fit into QFLAG_DTYPE)
+QFLAG_DTYPE = np.uint16
+FLAG_NUMBERS = {
+    'C01': 1, 'C02': 2, 'C03': 3, 'D01': 4, 'D02': 5, 'D03': 6, 'D04': 7, 'D05': 8, 'D06': 9, 'D07': 10,
+    'D08': 11, 'D09': 12, 'D10': 13, 'G': 14,
+}
+
+FLAG_IDS = {n: flag for flag, n in FLAG_NUMBERS.items()}
+FLAG_BITS = {flag: QFLAG_DTYPE(1 << n) for flag, n in FLAG_NUMBERS.items()}
+
+# Flags applied by Interface.run in this order (D08 is applied by flag_D07)
+FLAGS = ('C01', 'C02', 'C03', 'D01', 'D02', 'D03', 'D04', 'D05', 'D06', 'D07', 'D09', 'D10', 'G')
+# Flags applied by Interface.run to variables other than soil moisture
+THRESHOLD_FLAGS = ('C01', 'C02')
+
+# Columns the flags are computed on, converted to float64 when data is passed to Interface
+FLOAT_COLUMNS = tuple(t.variable_list) + ('total_precipitation', 'gldas_precipitation', 'gldas_soil_temperature')
+
+
+def flag_bit(tag) -> np.uint16:
+    """
+    Bit of the qflag bitmask belonging to a flag
+
+    Parameters
+    ----------
+    tag : string or int
+        flag id (e.g.: 'C01') or flag number (e.g.: 1)
+
+    Returns
+    -------
+    numpy.uint16
+        bitmask where only the bit of the respective flag is set
+    """
+    return FLAG_BITS[tag if isinstance(tag, str) else FLAG_IDS[tag]]
+
+
+def qflag_to_sets(qflag, flag_numbers=False) -> list:
+    """
+    Decodes qflag bitmasks into sets of flag tags.
+
+    Parameters
+    ----------
+    qflag : numpy.ndarray
+        uint16 bitmasks as stored in Interface.qflag
+    flag_numbers : bool
+        if true flag numbers are used as tags instead of flag ids (e.g.: 1 instead of 'C01')
+
+    Returns
+    -------
+    list
+        one set of tags per bitmask
+    """
+    values, inverse = np.unique(np.asarray(qflag, dtype=QFLAG_DTYPE), return_inverse=True)
+    # each distinct bitmask is decoded once, every row gets its own copy of the decoded set
+    tags = [
+        frozenset(FLAG_NUMBERS[flag] if flag_numbers else flag for flag, bit in FLAG_BITS.items() if v & bit)
+        for v in values
+    ]
+    return [set(tags[i]) for i in inverse.ravel().tolist()]
+
+
+def shift(values, periods, fill_value=np.nan) -> np.ndarray:
+    """
+    Shifts values by a number of positions (like pandas.Series.shift)
+
+    Parameters
+    ----------
+    values : numpy.ndarray
+        1-dimensional array of values
+    periods : int
+        number of positions to shift, positive values shift forward (value at t-periods is moved to t)
+    fill_value : scalar
+        value for positions without shifted value
+
+    Returns
+    -------
+    numpy.ndarray
+        shifted values
+    """
+    result = np.full_like(values, fill_value)
+    if periods > 0:
+        result[periods:] = values[:-periods]
+    elif periods < 0:
+        result[:periods] = values[-periods:]
+    else:
+        result[:] = values
+    return result
+
+
+def diff(values, periods=1) -> np.ndarray:
+    """
+    Difference of each value to the value periods positions before (like pandas.Series.diff with periods > 0)
+
+    Parameters
+    ----------
+    values : numpy.ndarray
+        1-dimensional array of float values
+    periods : int
+        number of positions to the subtracted value, the first periods positions are nan
+
+    Returns
+    -------
+    numpy.ndarray
+        differences
+    """
+    result = np.full_like(values, np.nan)
+    np.subtract(values[periods:], values[:-periods], out=result[periods:])
+    return result
+
+
+def soil_moisture_rise(sm) -> np.ndarray:
+    """
+    Finds soil moisture rises (criteria of flags D04 and D05 without precipitation): soil moisture increased during the
+    last hour and during the preceding 24h by more than 2x the std-dev of the last 25 hours.
+
+    Parameters
+    ----------
+    sm : numpy.ndarray
+        soil moisture values
+
+    Returns
+    -------
+    numpy.ndarray
+        boolean mask, true where soil moisture rises
+    """
+    std_x2 = pd.Series(sm).rolling(min_periods=1, window=25).std().to_numpy() * 2
+
+    rise24h = diff(sm, 24)
+    rise1h = diff(sm, 1)
+
+    mask = rise1h > 0
+    mask &= rise24h > std_x2
+    mask &= ~np.isclose(rise24h, std_x2)
+    return mask
+
+
+def peaks(sm) -> np.ndarray:
+    """
+    Checks for each soil moisture measurement if it is a positive or negative peak compared to its neighbours or
+    alternatively, if it and the following value are equal and form a positive or negative peak (lasting 2 hours).
+
+    Corresponds to a centered rolling window over t-1 to t+2 hours with at least 3 valid values. The first value is
+    evaluated on the truncated window of the first three measurements.
+
+    Parameters
+    ----------
+    sm : numpy.ndarray
+        soil moisture values
+
+    Returns
+    -------
+    numpy.ndarray
+       0 (no peak)
+       1 (peak)
+       2 (peak that lasts 2 hours)
+       nan (less than 3 valid values in window)
+    """
+    n = len(sm)
+    padded = np.concatenate([[np.nan], sm, [np.nan, np.nan]])
+    # soil moisture at t-1, t, t+1 and t+2
+    a0, a1, a2, a3 = (padded[k:k + n] for k in range(4))
+
+    peak_1h = ((a0 < a1) & (a1 > a2)) | ((a0 > a1) & (a1 < a2))
+    peak_2h = ((a0 < a1) & (a1 == a2) & (a2 > a3)) | ((a0 > a1) & (a1 == a2) & (a2 < a3))
+    valid = (~np.isnan(a0)).astype(int) + ~np.isnan(a1) + ~np.isnan(a2) + ~np.isnan(a3) >= 3
+
+    result = np.where(peak_1h, 1.0, np.where(peak_2h, 2.0, 0.0))
+    result[~valid] = np.nan
+    if valid[0]:
+        result[0] = peak_1h[1]
+    result[-1:] = np.nan
+
+    return result
+
+
+def plateau_mask(array_sequence) -> np.ndarray:
+    """
+    Generates a mask where Plateau criteria are fulfilled (flag D09).
+
+    Equals the cumulative sum of the sequence clipped to [0, 1] after each step, i.e. the mask holds the state
+    of the last non-zero element.
+
+    Parameters
+    ----------
+    array_sequence:  numpy ndarray
+        sequence of 1 (Plateau criteria fulfilled), -1(Plateau criteria no longer fulfilled), 0
+
+    Returns
+    -------
+    numpy.ndarray
+        sequence of 1 (Plateau criteria fulfilled) and 0 (Plateau criteria not fulfilled)
+    """
+    positions = np.where(array_sequence != 0, np.arange(len(array_sequence)), -1)
+    last_change = np.maximum.accumulate(positions)
+    return np.where(last_change >= 0, array_sequence[last_change] > 0, False).astype(int)
+
+
+def first_match(values, targets, starts, ends) -> np.ndarray:
+    """
+    First position from start to end (inclusive) of several ranges where the values equal the target of the range.
+    All ranges are searched at once in the values sorted by value and position.
+
+    Parameters
+    ----------
+    values : numpy.ndarray
+        1-dimensional array of float values, missing values never match
+    targets : numpy.ndarray
+        value to look for in each range
+    starts : numpy.ndarray
+        first position of each range
+    ends : numpy.ndarray
+        last position of each range
+
+    Returns
+    -------
+    numpy.ndarray
+        first matching position of each range, -1 if no value of the range equals the target
+    """
+    positions = np.flatnonzero(~np.isnan(values))
+    if not len(positions):
+        return np.full(len(targets), -1)
+    order = positions[np.argsort(values[positions], kind='stable')]
+    sorted_values = values[order]
+    # number the distinct values, so that rows of equal value are ordered by position within one sorted key
+    rank = np.concatenate(([0], np.cumsum(sorted_values[1:] != sorted_values[:-1])))
+    keys = rank * len(values) + order
+
+    target_index = np.minimum(np.searchsorted(sorted_values, targets), len(order) - 1)
+    target_rank = rank[target_index] * len(values)
+    match_index = np.minimum(np.searchsorted(keys, target_rank + starts), len(order) - 1)
+    match = (sorted_values[target_index] == targets) & (keys[match_index] >= target_rank + starts) & (
+        keys[match_index] <= target_rank + ends
+    )
+    return np.where(match, order[match_index], -1)
+
+
+def window_mean(values, starts, ends) -> np.ndarray:
+    """
+    Means of the values from start (inclusive) to end (exclusive) of several windows, computed from cumulative sums
+    so that overlapping windows are not summed up repeatedly. Missing values are skipped (like pandas.Series.mean).
+
+    Parameters
+    ----------
+    values : numpy.ndarray
+        1-dimensional array of float values
+    starts : numpy.ndarray
+        first position of each window
+    ends : numpy.ndarray
+        position after the last position of each window
+
+    Returns
+    -------
+    numpy.ndarray
+        mean of each window, nan if the window holds no valid value
+    """
+    valid = ~np.isnan(values)
+    sums = np.concatenate(([0.0], np.cumsum(np.where(valid, values, 0.0))))
+    counts = np.concatenate(([0], np.cumsum(valid)))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (sums[ends] - sums[starts]) / (counts[ends] - counts[starts])
+
+
+def renumber_plateaus(array) -> np.ndarray:
+    """
+    Possible plateaus (flag D10) are numbered consecutively.
+    (e.g.: array([1,0,1,1,0,0,1,1)] -> [1,0,2,2,0,0,3,3])
+
+    Parameters
+    ----------
+    array : ndarray
+        1-dimensional array containing mask where variance of soil moisture observations are below 0.05 for 12h
+
+    Returns
+    -------
+    seq : numpy.ndarray
+        Sequence containing rising group numbers (potential plateaus).
+    """
+    array = np.asarray(array, dtype=bool)
+    starts = array.copy()
+    starts[1:] &= ~array[:-1]
+    return np.cumsum(starts) * array
+
+
+def rolling_extreme(values, size, largest=True, origin=0) -> np.ndarray:
+    """
+    Maximum (or minimum) within a moving window, ignoring nan values.
+
+    Parameters
+    ----------
+    values : numpy.ndarray
+        1-dimensional array of values
+    size : int
+        length of the moving window
+    largest : bool
+        if true the maximum is calculated, otherwise the minimum
+    origin : int
+        shift of the window, 0 centers the window at t (see scipy.ndimage.maximum_filter1d)
+
+    Returns
+    -------
+    numpy.ndarray
+        extreme value of each window, nan for windows without valid values. Windows are truncated at the edges.
+    """
+    fill = -np.inf if largest else np.inf
+    extreme_filter = maximum_filter1d if largest else minimum_filter1d
+    result = extreme_filter(np.where(np.isnan(values), fill, values), size, mode='nearest', origin=origin)
+    result[result == fill] = np.nan
+    return result
+
 
 class Interface(object):
     """
@@ -74,6 +392,13 @@ class Interface(object):
     ----------
     data : pandas.DataFrame
         DataFrame containing in situ soil moisture measurement
+    qflag : numpy.ndarray
+        uint16 bitmask of the applied flags for each row of data, bit n is set for flag number n
+    arrays : dict
+        values of the columns of data used by the flags (and their lagged values) as contiguous float64 arrays and
+        intermediate results shared by several flags, computed once per run
+    diagnostics : dict
+        intermediate results of the applied flags (e.g.: 'eq4', 'rel_var'), added to data by run if requested
 
     Methods
     -------
@@ -93,14 +418,23 @@ class Interface(object):
 
         if 'soil_moisture' not in self.data.columns:
             self.variable = self.get_variable_from_data()
-            self.data['qflag'] = data[self.variable].apply(lambda x: set())
-
         else:
-            self.data['qflag'] = data.soil_moisture.apply(lambda x: set())
             self.variable = 'soil_moisture'
 
+        dtypes = self.data.dtypes
+        for name in FLOAT_COLUMNS:
+            dtype = dtypes.get(name, np.float64)
+            if dtype != np.float64:
+                warnings.warn(f"Column '{name}' of dtype {dtype} is converted to float64.", stacklevel=2)
+                self.data[name] = self.data[name].astype(np.float64)
+
+        self.qflag = np.zeros(len(self.data), dtype=QFLAG_DTYPE)
+        self.data['qflag'] = qflag_to_sets(self.qflag)
+        self.arrays = {}
+        self.diagnostics = {}
+
     def run(
-        self, name=None, sat_point=None, depth_from=None, flag_numbers=False
+        self, name=None, sat_point=None, depth_from=None, flag_numbers=False, diagnostics=False
     ) -> pd.DataFrame:
         """
         Applies all quality control algorithms when keyword name is not set. However for flag C03 a threshold value
@@ -109,7 +443,8 @@ class Interface(object):
         Parameters
         ----------
         name : list
-            provide list of flags to only apply these flags
+            provide list of flags to only apply these flags, by default all flags are applied to soil moisture and
+            the threshold flags (C01, C02) to other variables
         sat_point : float
                 Saturation Point in % vol for soil at the respective location.
                 At ISMN the saturation point is calculated from Harmonized World Soil Database (HWSD) sand, clay
@@ -122,6 +457,8 @@ class Interface(object):
         flag_numbers : bool
                 if true flag numbers are used as tags in the qflag column instead of flag ids (e.g.: '1' instead of
                 'C01', '14' instead of 'G')
+        diagnostics : bool
+                if true the intermediate results of the flags (e.g.: 'eq4', 'rel_var') are added as columns to data
 
         Returns
         -------
@@ -129,6 +466,8 @@ class Interface(object):
             DataFrame including ISMN quality flags in column "qflag".
         """
         keys = self.data.keys()
+        self.arrays = {}
+        self.diagnostics = {}
 
         if name:
             assert isinstance(name, (list)), "If 'name' is provided then it must be a list"
@@ -139,30 +478,23 @@ class Interface(object):
             self.depth_from = depth_from
         if self.variable == 'soil_moisture':
             self.apply_savgol()
-        if not flag_numbers:
-            flags_dict = {
-                'C01': self.flag_C01, 'C02': self.flag_C02, 'C03': self.flag_C03, 'D01': self.flag_D01,
-                'D02': self.flag_D02, 'D03': self.flag_D03, 'D04': self.flag_D04, 'D05': self.flag_D05,
-                'D06': self.flag_D06, 'D07': self.flag_D07, 'D09': self.flag_D09, 'D10': self.flag_D10,
-                'G': self.flag_G,
-            }
-        else:
-            flags_dict = {
-                1: self.flag_C01, 2: self.flag_C02, 3: self.flag_C03, 4: self.flag_D01,
-                5: self.flag_D02, 6: self.flag_D03, 7: self.flag_D04, 8: self.flag_D05,
-                9: self.flag_D06, 10: self.flag_D07, 12: self.flag_D09, 13: self.flag_D10,
-                14: self.flag_G,
-            }
-
-        if name is not None:
-            if type(name) == list:
-                for key in name:
-                    flags_dict[key](key)
-            elif type(name) == str:
-                flags_dict[name](name)
-        else:
-            for key in flags_dict.keys():
-                flags_dict[key](key)
+
+        if name is None:
+            # only the threshold flags apply to variables other than soil moisture
+            flags = FLAGS if self.variable == 'soil_moisture' else THRESHOLD_FLAGS
+            name = [FLAG_NUMBERS[flag] for flag in flags] if flag_numbers else list(flags)
+        elif type(name) == str:
+            name = [name]
+        for key in name:
+            flag = FLAG_IDS[key] if flag_numbers else key
+            if flag not in FLAGS:
+                raise KeyError(key)
+            getattr(self, 'flag_' + flag)(key)
+
+        self.data['qflag'] = qflag_to_sets(self.qflag, flag_numbers)
+        if diagnostics:
+            for column, values in self.diagnostics.items():
+                self.data[column] = values
 
         return self.data[keys]
 
@@ -202,10 +534,146 @@ class Interface(object):
     def apply_savgol(self) -> None:
         """
         Calculates and adds derivations 1 and 2 using Savitzky-Golay filter
+
+        Both derivatives are computed with scipy.ndimage.convolve1d and the precomputed coefficients, the same
+        convolution as scipy.signal.savgol_filter(..., 3, 2, deriv, mode='nearest').
+        """
+        sm = self.column('soil_moisture')
+        self.arrays['deriv1'] = convolve1d(sm, SAVGOL_COEFFS[0], mode='nearest')
+        self.arrays['deriv2'] = convolve1d(sm, SAVGOL_COEFFS[1], mode='nearest')
+        self.data['deriv1'] = self.arrays['deriv1']
+        self.data['deriv2'] = self.arrays['deriv2']
+
+    def column(self, name) -> np.ndarray:
+        """
+        Values of a column of data as contiguous float64 array, the array is extracted only once per run
+
+        Parameters
+        ----------
+        name : string
+            column name
+
+        Returns
+        -------
+        numpy.ndarray
+            column values
+        """
+        if name not in self.arrays:
+            if name in ('deriv1', 'deriv2'):
+                # derivatives of soil moisture are computed once, also if a flag is applied outside of run
+                self.apply_savgol()
+            else:
+                self.arrays[name] = np.ascontiguousarray(self.data[name].to_numpy(dtype=np.float64))
+        return self.arrays[name]
+
+    def lagged(self, name, periods) -> np.ndarray:
+        """
+        Values of a column of data shifted by periods (see shift), kept with the column arrays so that flags
+        sharing the same lag do not recompute it
+
+        Parameters
+        ----------
+        name : string
+            column name
+        periods : int
+            number of positions to shift
+
+        Returns
+        -------
+        numpy.ndarray
+            shifted column values
+        """
+        key = (name, periods)
+        if key not in self.arrays:
+            self.arrays[key] = shift(self.column(name), periods)
+        return self.arrays[key]
+
+    def deriv2_ratio(self) -> np.ndarray:
+        """
+        Absolute ratio of the second derivatives at t-1 and t+1 hours, shared by flags D06 (eq5) and D07 (eq9a) and
+        computed once per run
+
+        Returns
+        -------
+        numpy.ndarray
+            abs(deriv2[t-1] / deriv2[t+1])
+        """
+        if 'deriv2_ratio' not in self.arrays:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                ratio = self.lagged('deriv2', 1) / self.lagged('deriv2', -1)
+            self.arrays['deriv2_ratio'] = np.abs(ratio, out=ratio)
+        return self.arrays['deriv2_ratio']
+
+    def add_diagnostic(self, name, values, valid=None) -> None:
+        """
+        Keeps intermediate results of a flag, which are added as column to data if requested in run
+
+        Parameters
+        ----------
+        name : string
+            column name
+        values : numpy.ndarray
+            values for each row of data or for the rows selected by valid
+        valid : numpy.ndarray, optional
+            boolean mask of the rows the values belong to, other rows are set to nan
+        """
+        if valid is not None:
+            expanded = np.full(len(valid), np.nan)
+            expanded[valid] = values
+            values = expanded
+        self.diagnostics[name] = values
+
+    def add_flag(self, mask, tag) -> None:
         """
-        self.data['deriv1'] = savgol(self.data.soil_moisture, 3, 2, 1, mode='nearest')
-        self.data['deriv2'] = savgol(self.data.soil_moisture, 3, 2, 2, mode='nearest')
+        Sets the bit of a flag in the qflag bitmask where mask is true
 
+        Parameters
+        ----------
+        mask : array_like
+            boolean mask with the length of data
+        tag : string or int
+            flag id or flag number of the flag to set
+        """
+        np.bitwise_or(self.qflag, flag_bit(tag), out=self.qflag, where=np.asarray(mask, dtype=bool))
+
+    def rise_without_precipitation(self, total_precipitation, min_precipitation) -> np.ndarray:
+        """
+        Finds soil moisture rises (see soil_moisture_rise) while the precipitation sum of the preceding 24h stays
+        below the minimum precipitation. The soil moisture rises are computed once per run for flags D04 and D05.
+
+        Parameters
+        ----------
+        total_precipitation : numpy.ndarray
+            precipitation sum over the preceding 24h
+        min_precipitation : float
+            minimum precipitation that constitutes a rain event
+
+        Returns
+        -------
+        numpy.ndarray
+            boolean mask, true where soil moisture rises without precipitation event
+        """
+        if 'soil_moisture_rise' not in self.arrays:
+            self.arrays['soil_moisture_rise'] = soil_moisture_rise(self.column('soil_moisture'))
+        return self.arrays['soil_moisture_rise'] & (total_precipitation < min_precipitation)
+
+    def add_threshold_flag(self, name, compare, threshold, tag) -> None:
+        """
+        Adds a flag where the values of a column compare to a threshold, nothing is flagged if data lacks the column
+
+        Parameters
+        ----------
+        name : string
+            column name
+        compare : numpy.ufunc
+            comparison (e.g.: numpy.less), true where the flag applies
+        threshold : float
+            threshold the values are compared to
+        tag : string or int
+            flag id (e.g.: 'C01') or flag number (e.g.: 1)
+        """
+        if name in self.data.columns:
+            self.add_flag(compare(self.column(name), threshold), tag)
 
     def get_variable_from_data(self) -> str:
         """
@@ -229,12 +697,7 @@ class Interface(object):
         tag : string or int, optional
         code added to qflag-column when flag-criteria are met
         """
-        low_boundary = t.low_boundary(self.variable)
-
-        index = self.data[self.data[self.variable] < low_boundary].index
-
-        if len(index):
-            self.data['qflag'][index].apply(lambda x: x.add(tag))
+        self.add_threshold_flag(self.variable, np.less, t.low_boundary(self.variable), tag)
 
     def flag_C02(self, tag):
         """
@@ -246,10 +709,7 @@ class Interface(object):
         tag : string or int, optional
         code added to qflag-column when flag-criteria are met
         """
-        upper_boundary = t.hi_boundary(self.variable)
-        index = self.data[self.data[self.variable] > upper_boundary].index
-        if len(index):
-            self.data['qflag'][index].apply(lambda x: x.add(tag))
+        self.add_threshold_flag(self.variable, np.greater, t.hi_boundary(self.variable), tag)
 
     def flag_C03(self, tag):
         """
@@ -266,9 +726,7 @@ class Interface(object):
         if not self.sat_point:
             return
 
-        index = self.data.loc[self.data.soil_moisture > self.sat_point].index
-        if len(index):
-            self.data['qflag'][index].apply(lambda x: x.add(tag))
+        self.add_threshold_flag('soil_moisture', np.greater, self.sat_point, tag)
 
     def flag_D01(self, tag):
         """
@@ -280,10 +738,7 @@ class Interface(object):
         tag : string or int, optional
         code added to qflag-column when flag-criteria are met
         """
-        if 'soil_temperature' in self.data.columns:
-            index = self.data[self.data.soil_temperature < t.ancillary_ts_lower].index
-            if len(index):
-                self.data['qflag'][index].apply(lambda x: x.add(tag))
+        self.add_threshold_flag('soil_temperature', np.less, t.ancillary_ts_lower, tag)
 
     def flag_D02(self, tag):
         """
@@ -295,10 +750,7 @@ class Interface(object):
         tag : string or int, optional
         code added to qflag-column when flag-criteria are met
         """
-        if 'air_temperature' in self.data.columns:
-            index = self.data[self.data['air_temperature'] < t.ancillary_ta_lower].index
-            if len(index):
-                self.data['qflag'][index].apply(lambda x: x.add(tag))
+        self.add_threshold_flag('air_temperature', np.less, t.ancillary_ta_lower, tag)
 
     def flag_D03(self, tag):
         """
@@ -310,12 +762,7 @@ class Interface(object):
         tag : string or int, optional
         code added to qflag-column when flag-criteria are met
         """
-        if 'gldas_soil_temperature' in self.data.columns:
-            index = self.data[
-                self.data['gldas_soil_temperature'] < t.ancillary_ts_lower
-            ].index
-            if len(index):
-                self.data['qflag'][index].apply(lambda x: x.add(tag))
+        self.add_threshold_flag('gldas_soil_temperature', np.less, t.ancillary_ts_lower, tag)
 
     def flag_D04(self, tag):
         """
@@ -343,25 +790,15 @@ class Interface(object):
                 if self.depth_from != 0:
                     min_precipitation = float(self.depth_from) * 0.05 * 0.5 * 1000
 
-            if not 'total_precipitation' in self.data.columns:
-                self.data['total_precipitation'] = round(
-                    self.data['precipitation'].rolling(min_periods=1, window=24).sum(),
-                    1,
+            if 'total_precipitation' in self.data.columns:
+                total_precipitation = self.column('total_precipitation')
+            else:
+                total_precipitation = np.round(
+                    pd.Series(self.column('precipitation')).rolling(min_periods=1, window=24).sum().to_numpy(), 1
                 )
-            self.data['std_x2'] = (
-                self.data['soil_moisture'].rolling(min_periods=1, window=25).std() * 2
-            )
-            self.data['rise24h'] = self.data['soil_moisture'].diff(24)
-            self.data['rise1h'] = self.data['soil_moisture'].diff(1)
-
-            index = self.data[
-                (self.data['rise1h'] > 0)
-                & (self.data['rise24h'] > self.data['std_x2'])
-                & ~np.isclose(self.data['rise24h'], self.data['std_x2'])
-                & (self.data['total_precipitation'] < min_precipitation)
-            ].index
+                self.add_diagnostic('total_precipitation', total_precipitation)
 
-            self.data['qflag'][index].apply(lambda x: x.add(tag))
+            self.add_flag(self.rise_without_precipitation(total_precipitation, min_precipitation), tag)
 
     def flag_D05(self, tag):
         """
@@ -386,28 +823,17 @@ class Interface(object):
                 if self.depth_from != 0:
                     min_precipitation = float(self.depth_from) * 0.05 * 0.5 * 1000
 
-            # Add dropna in order not to stretch the period of gldas_total_precipitation for which there is no data
-            self.data['gldas_total_precipitation'] = (
-                self.data['gldas_precipitation']
-                .dropna()
-                .rolling(min_periods=1, window=24)
-                .sum()
-            )
-            self.data['gl_std_x2'] = (
-                self.data['soil_moisture'].rolling(min_periods=1, window=25).std() * 2
+            # Sum up valid values only in order not to stretch the period of gldas_total_precipitation for which there
+            # is no data
+            gldas_precipitation = self.column('gldas_precipitation')
+            valid = ~np.isnan(gldas_precipitation)
+            gldas_total_precipitation = np.full_like(gldas_precipitation, np.nan)
+            gldas_total_precipitation[valid] = (
+                pd.Series(gldas_precipitation[valid]).rolling(min_periods=1, window=24).sum().to_numpy()
             )
-            self.data['gl_rise24h'] = self.data['soil_moisture'].diff(24)
-            self.data['gl_rise1h'] = self.data['soil_moisture'].diff(1)
+            self.add_diagnostic('gldas_total_precipitation', gldas_total_precipitation)
 
-            index = self.data[
-                (self.data['gl_rise1h'] > 0)
-                & (self.data['gl_rise24h'] > self.data['gl_std_x2'])
-                & ~np.isclose(self.data['gl_rise24h'], self.data['gl_std_x2'])
-                & (self.data['gldas_total_precipitation'] < min_precipitation)
-            ].index
-
-            if len(index):
-                self.data['qflag'][index].apply(lambda x: x.add(tag))
+            self.add_flag(self.rise_without_precipitation(gldas_total_precipitation, min_precipitation), tag)
 
     def flag_D06(self, tag):
         """
@@ -422,113 +848,39 @@ class Interface(object):
         code added to qflag-column when flag-criteria are met
         """
 
-        def rolling_var(sm_array) -> float:
-            """
-            Calulates variance of soil moisture over a time-range from t-12, t+12 hours without the current value
-
-            Parameters
-            ----------
-            sm_array : numpy.ndarray
-                soil moisture values from t-12 to t+12 hours
-
-            Returns
-            -------
-            float
-                Soil moisture variance within 25 hours without the current value
-            """
-            sm_array = np.delete(sm_array, 12, axis=0)
-            sm_array = sm_array[~np.isnan(sm_array)]
-            return ((sm_array - sm_array.mean()) ** 2).sum() / (len(sm_array) - 1)
-
-        def rolling_mean(sm_array):
-            """
-            mean of 12h before and after timestamp.
-
-            Returns
-            -------
-            float
-                Mean soil moisture within 25 hours without the current value
-            """
-            assert len(sm_array) == 25
-            return np.delete(sm_array, 12).mean()
-
-        def peak(sm_array) -> int:
-            """
-            Checks if middle element of three consecutive soil moisture measurements is a positive or negative peak or
-            alternatively, if middle two values of four consecutive measurements are equal and form a positive or
-            negative peak.
-
-            Parameters
-            ----------
-            sm_array : numpy.ndarray
-                soil moisture values from t-1 to t+1 hours
-
-            Returns
-            -------
-            int
-               0 (no peak)
-               1 (peak)
-               2 (peak that lasts 2 hours)
-            """
-            if ((sm_array[0] < sm_array[1]) & (sm_array[1] > sm_array[2])) | (
-                (sm_array[0] > sm_array[1]) & (sm_array[1] < sm_array[2])
-            ):
-                return 1
-            elif len(sm_array) > 3:
-                if (
-                    (sm_array[0] < sm_array[1])
-                    & (sm_array[1] == sm_array[2])
-                    & (sm_array[2] > sm_array[3])
-                ) | (
-                    (sm_array[0] > sm_array[1])
-                    & (sm_array[1] == sm_array[2])
-                    & (sm_array[2] < sm_array[3])
-                ):
-                    return 2
-            return 0
-
-        self.data['eq4'] = round(self.data['soil_moisture'] .shift(-1)
-            .div(self.data['soil_moisture'], axis=0) .shift(1), 3)
-        self.data['eq5'] = round(
-            abs(self.data['deriv2'].div(self.data['deriv2'].shift(-2), axis=0).shift(1)), 3)
-
-        # calculate relative variance at time t
-        self.data['eq6'] = abs(
-            self.data['soil_moisture']
-            .rolling(min_periods=25, window=25, center=True)
-            .apply(rolling_var, raw=True)
-        ).div(
-            self.data['soil_moisture']
-            .rolling(window=25, center=True)
-            .apply(rolling_mean, raw=True),
-            axis=0,
-        )
-
-        self.data['eq_new1'] = (
-            self.data['soil_moisture']
-            .rolling(min_periods=3, window=4, center=True)
-            .apply(peak, raw=True)
-            .shift(-1)
-        )
-
-        self.data['spike_2h'] = self.data['eq_new1'].shift(1) > 1
-
-        self.data['spike'] = (
-            (
-                ((self.data['eq4'] > 1.15) | (self.data['eq4'] < 0.85))
-                | (self.data['spike_2h'] > 0)
-            )
-            & ((self.data['eq5'] > 0.8) & (self.data['eq5'] < 1.2))
-            & (self.data['eq6'] < 1)
-            & (self.data['eq_new1'] > 0)
-        )
-
-        index = self.data[
-            (self.data.spike > 0)
-            | ((self.data.spike.shift(1) > 0) & (self.data['spike_2h'] > 0))
-        ].index
+        sm = self.column('soil_moisture')
+        deriv2 = self.column('deriv2')
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # round in place, without allocating a rounded copy
+            eq4 = sm / self.lagged('soil_moisture', 1)
+            np.round(eq4, 3, out=eq4)
+            eq5 = np.round(self.deriv2_ratio(), 3)
+
+            # calculate relative variance at time t: variance / mean of the 24 values from t-12 to t+12 hours without
+            # t, using sum and sum of squares of the 25 hour window minus the contribution of the current value
+            sm_sum = pd.Series(sm).rolling(window=25, center=True).sum().to_numpy() - sm
+            sm_sq_sum = pd.Series(sm * sm).rolling(window=25, center=True).sum().to_numpy() - sm * sm
+            eq6 = np.abs((sm_sq_sum - sm_sum * sm_sum / 24) / 23) / (sm_sum / 24)
+
+        eq_new1 = peaks(sm)
+        spike_2h = shift(eq_new1, 1) > 1
+
+        # combine the criteria in place instead of allocating a new mask for each operator
+        spike = eq4 > 1.15
+        spike |= eq4 < 0.85
+        spike |= spike_2h
+        spike &= eq5 > 0.8
+        spike &= eq5 < 1.2
+        spike &= eq6 < 1
+        spike &= eq_new1 > 0
+
+        for name, values in (
+            ('eq4', eq4), ('eq5', eq5), ('eq6', eq6), ('eq_new1', eq_new1), ('spike_2h', spike_2h), ('spike', spike)
+        ):
+            self.add_diagnostic(name, values)
 
-        self.data['qflag'][index].apply(lambda x: x.add(tag))
+        self.add_flag(spike | (shift(spike, 1, False) & spike_2h), tag)
 
     def flag_D07(self, tag):
         """
@@ -551,50 +903,58 @@ class Interface(object):
         code added to qflag-column when flag-criteria are met
         """
 
-        self.data['absolute_change'] = self.data['soil_moisture'] - self.data[
-            'soil_moisture'
-        ].shift(1)
-        self.data['eq7'] = abs(self.data['absolute_change'].div(self.data['soil_moisture']))
-        self.data['eq8'] = abs(self.data['deriv1'].rolling(min_periods=4, window=25, center=True).mean() * 10)
-        self.data['eq9'] = round(abs(self.data['deriv2'].shift(1).div(self.data['deriv2'])), 1)
-        self.data['eq9a'] = abs(self.data['deriv2'].div(self.data['deriv2'].shift(-2)))
+        sm = self.column('soil_moisture')
+        deriv1 = self.column('deriv1')
+        deriv2 = self.column('deriv2')
+
+        absolute_change = diff(sm, 1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            eq7 = absolute_change / sm
+            np.abs(eq7, out=eq7)
+            eq8 = pd.Series(deriv1).rolling(min_periods=4, window=25, center=True).mean().to_numpy() * 10
+            np.abs(eq8, out=eq8)
+            eq9 = self.lagged('deriv2', 1) / deriv2
+            np.abs(eq9, out=eq9)
+            np.round(eq9, 1, out=eq9)
+            # abs(deriv2[t] / deriv2[t+2])
+            eq9a = shift(self.deriv2_ratio(), -1)
+
+        abs_change = np.abs(absolute_change)
+        abs_deriv1 = np.abs(deriv1)
 
         # Include drops to zero!
-        self.data['eq_new2'] = (abs(self.data['absolute_change']) > 5) & (
-            self.data['soil_moisture'] == 0
+        eq_new2 = abs_change > 5
+        eq_new2 &= sm == 0
+
+        # combine the criteria of the relative and absolute change in place, the remaining criteria are only
+        # evaluated at the (few) observations with such a change
+        mask = eq7 > 0.1
+        mask &= abs_change > 1
+        mask &= sm != 0
+        candidates = np.flatnonzero(mask)
+        mask[candidates] = (
+            (abs_deriv1[candidates] > eq8[candidates])
+            & ~np.isclose(abs_deriv1[candidates], eq8[candidates])
+            & np.isclose(eq9[candidates], 1, atol=1e-2)
+            & (deriv2[candidates] != 0)
+            & (eq9a[candidates] > 10)
         )
 
-        index = self.data[
-            (self.data['eq7'] > 0.1)
-            & (abs(self.data['absolute_change']) > 1)
-            & (self.data['soil_moisture'] != 0)
-            & (abs(self.data['deriv1']) > self.data['eq8'])
-            & ~np.isclose(abs(self.data['deriv1']), self.data['eq8'])
-            & (np.isclose(self.data['eq9'], 1, atol=1e-2))
-            & (self.data['deriv2'] != 0)
-            & (self.data['eq9a'] > 10)
-        ].index
-
-        index_neg = index.intersection(self.data[self.data['deriv1'] < 0].index)
-        index_pos = index.intersection(self.data[self.data['deriv1'] > 0].index)
-
-        index_zero = self.data[
-            self.data['eq_new2'] > 0
-        ].index  # index where there are drops to zero
-        index_neg = index_neg.append(index_zero)
-
-        if len(index_neg):
-            self.data['qflag'][index_neg].apply(lambda x: x.add(tag))
-
-        # Change tag to indicate soil moisture jumps
-        if isinstance(tag, int):
-            tag += 1
-        elif tag == 'D07':
-            tag = 'D08'
-
-        # Includes soil moisture jumps (flag D08)
-        if len(index_pos):
-            self.data['qflag'][index_pos].apply(lambda x: x.add(tag))
+        for name, values in (
+            ('absolute_change', absolute_change), ('eq7', eq7), ('eq8', eq8), ('eq9', eq9), ('eq9a', eq9a),
+            ('eq_new2', eq_new2),
+        ):
+            self.add_diagnostic(name, values)
+
+        # drops and drops to zero
+        mask_neg = mask & (deriv1 < 0)
+        mask_neg |= eq_new2
+        mask_pos = mask & (deriv1 > 0)
+
+        self.add_flag(mask_neg, tag)
+
+        # Includes soil moisture jumps (flag D08), the tag (flag id or number) is chosen when qflag is decoded
+        self.add_flag(mask_pos, 'D08')
 
     def flag_D08(self):
         """
@@ -618,73 +978,41 @@ class Interface(object):
         code added to qflag-column when flag-criteria are met
         """
 
-        self.data.dropna(subset=['soil_moisture'], inplace=True)
+        # Work on observations with soil moisture value only - plateau can bridge gap
+        valid = ~np.isnan(self.column('soil_moisture'))
+        sm = self.column('soil_moisture')[valid]
 
         # calculate relative variance
-        self.data['rel_var'] = round(
-            self.data['soil_moisture']
-            .rolling(min_periods=13, window=13)
-            .var()
-            .shift(-12),
-            4,
-        ) / round(
-            self.data['soil_moisture']
-            .rolling(min_periods=13, window=13)
-            .mean()
-            .shift(-12),
-            4,
-        )
+        rolling_sm = pd.Series(sm).rolling(min_periods=13, window=13)
+        var = shift(rolling_sm.var().to_numpy(), -12)
+        mean = shift(rolling_sm.mean().to_numpy(), -12)
+        np.round(var, 4, out=var)
+        np.round(mean, 4, out=mean)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rel_var = np.divide(var, mean, out=var)
 
         # When sm == 0 for >12h => the mean equals 0 => relative variance is therefore calculated as nan
         # To catch periods of sm=0 after a sm-drop to zero (D07 criteria 4): reset these nan-values to 0
-        self.data['rel_var'][
-            self.data['rel_var'].isna() & (self.data['soil_moisture'] == 0)
-        ] = 0.0
+        rel_var[np.isnan(rel_var) & (sm == 0)] = 0.0
 
         # find where there is a drop in soil moisture (flag D07) and a period of low relative variance
-        flag_D07 = 'D07'
-        if type(tag) == int:
-            flag_D07 = 10
-        self.data['event'] = (self.data['qflag'].astype(str)).str.contains(
-            str(flag_D07)
-        ) & (self.data['rel_var'] < 0.001)
-        self.data['event'].replace(np.nan, 0, inplace=True)
-        self.data['event'] = self.data['event'].astype(int)
+        event = (((self.qflag[valid] & flag_bit('D07')) != 0) & (rel_var < 0.001)).astype(np.int8)
 
         # assign -1 where the "event" could end and create a pleateau_mask
-        self.data.loc[
-            (self.data[['rel_var']].max(1).diff() >= 0.001) & (self.data['event'] == 0),
-            'event',
-        ] = -1
-
-        def plateau_mask(array_sequence) -> list:
-            """
-            Generates a mask where Plateau criteria are fulfilled.
-
-            Parameters
-            ----------
-            array_sequence:  numpy ndarray
-                sequence of 1 (Plateau criteria fulfilled), -1(Plateau criteria no longer fulfilled), 0
-
-            Returns
-            -------
-            list
-                sequence of 1 (Plateau criteria fulfilled) and 0 (Plateau criteria not fulfilled)
-            """
-            return reduce(lambda x, y: x + [max(min(x[-1] + y, 1), 0)], array_sequence, [0])[1:]
+        with np.errstate(invalid='ignore'):
+            event[((rel_var - shift(rel_var, 1)) >= 0.001) & (event == 0)] = -1
 
-        self.data['plateau'] = plateau_mask(self.data['event'].values)
+        plateau = plateau_mask(event)
 
         # Extend each Plateau to at least 13h time (minimum period)
-        self.data['end'] = self.data['plateau'].rolling(min_periods=13, window=13).max()
+        end = pd.Series(plateau).rolling(min_periods=13, window=13).max().to_numpy()
 
-        index = self.data[self.data['end'] > 0.0].index
+        for name, values in (('rel_var', rel_var), ('event', event), ('plateau', plateau), ('end', end)):
+            self.add_diagnostic(name, values, valid)
 
-        if len(index):
-            self.data['qflag'][index].apply(lambda x: x.add(tag))
-
-        if type(self.data.index) == pd.core.indexes.datetimes.DatetimeIndex:
-            self.data = self.data.resample('H').asfreq()
+        mask = np.zeros(len(valid), dtype=bool)
+        mask[valid] = end > 0.0
+        self.add_flag(mask, tag)
 
     def flag_D10(self, tag):
         """
@@ -704,113 +1032,98 @@ class Interface(object):
         code added to qflag-column when flag-criteria are met
         """
 
-        def renumber_plateaus(array) -> list:
-            """
-            Possible plateaus are numbered consecutively.
-            (e.g.: array([1,0,1,1,0,0,1,1)] -> [1,0,2,2,0,0,3,3])
-
-            Parameters
-            ----------
-            array : ndarray
-                1-dimensional array containing mask where variance of soil moisture observations are below 0.05 for 12h
-
-            Returns
-            -------
-            seq : list
-                Sequence containing rising group numbers (potential plateaus).
-            """
-            group = 1
-            seq = []
-            for a, b in zip(array, array[1:]):
-                seq.append((lambda x: group if x > 0 else 0)(a))
-                if a == 1 and b == 0:
-                    group += 1
-            return seq + [group * array[-1]]
+        # Throw out datagaps - plateau can bridge gap
+        valid = ~np.isnan(self.column('soil_moisture'))
+        sm = self.column('soil_moisture')[valid]
+        deriv1 = self.column('deriv1')[valid]
 
         # Mean of plateau must be higher than 95% of this threshold;
         # For ISMN quality flags the previous 2 years of data are taken into account.
-        highest_sm_value = self.data['soil_moisture'][
-            self.data['soil_moisture'] < 60
-        ].max()
-
-        # Throw out datagaps - plateau can bridge gap
-        self.data.dropna(subset=['soil_moisture'], inplace=True)
+        highest_sm_value = sm[sm < 60].max() if np.any(sm < 60) else np.nan
 
         # Look for periods of low variance (VAR) and assign rising numbers
-        self.data.loc[:, 'VAR'] = (
-            self.data['soil_moisture']
-            .rolling(min_periods=12, window=12)
-            .var()
-            .shift(-11)
-            <= 0.05
-        )
-        self.data['VAR_grouped'] = renumber_plateaus(self.data.VAR.values)
+        VAR = shift(pd.Series(sm).rolling(min_periods=12, window=12).var().to_numpy(), -11) <= 0.05
+        groups = renumber_plateaus(VAR)
 
-        # Look for maximum rise and minimum drop within 25 hours for each period of low varicance
-        self.data.loc[:, 'maximum'] = (self.data['deriv1'].rolling(window=25, min_periods=1).max().shift(-12))
-        self.data.loc[:, 'minimum'] = (self.data['deriv1'].rolling(window=25, min_periods=1).min().shift(-24))
+        # Look for maximum rise (t-12 to t+12h) and minimum drop (t to t+24h) for each period of low varicance
+        maximum = rolling_extreme(deriv1, 25)
+        maximum[-12:] = np.nan
+        minimum = rolling_extreme(deriv1, 25, largest=False, origin=-12)
+        minimum[-24:] = np.nan
 
         # extend pre-existing plateau in database, adds artificial starting point for plateau
         if 'd10_mask' in self.data.columns:
-            self.data.loc[:, 'maximum'][self.data.d10_mask > 0] = 99
-
-        rise = round(self.data.groupby('VAR_grouped')['maximum'].first(), 3)
-        drop = round(self.data.groupby('VAR_grouped')['minimum'].last(), 3)
-        rise = rise[rise >= 0.25]
-        drop = drop[drop < 0]
-
-        possible_plateaus = pd.concat([rise, drop], axis=1)
-        possible_plateaus.dropna(inplace=True)
-
-        index = []
-        for idx, row in possible_plateaus.iterrows():
-            # Look for possible plateaus including both a soil moisture rise and drop
-            self.data['VAR_rise_drop'] = self.data.VAR_grouped[(self.data.VAR_grouped == idx)]
-            VAR_period = (self.data['VAR_rise_drop'].rolling(window=12, min_periods=1).max() == idx)
-
-            # max lies inside of VAR period
-            if not self.data.index[VAR_period & (self.data['deriv1'] == row.maximum)].empty:
-                max_search_period_start = self.data.index[VAR_period & (self.data['deriv1'] == row.maximum)][0]
-                # min lies within VAR period
-                if not self.data.index[VAR_period & (self.data['deriv1'] == row.minimum)].empty:
-                    min_search_period_end = self.data.index[VAR_period & (self.data['deriv1'] == row.minimum)][0]
-                # min lies outside VAR
-                else:
-                    min_search_period_end = VAR_period[::-1].idxmax()
-
-            # max lies outside of VAR period
-            else:
-                max_search_period_start = VAR_period.idxmax()
-                # mimimum within VAR period
-                if not self.data.index[VAR_period & (self.data['deriv1'] == row.minimum)].empty:
-                    min_search_period_end = self.data.index[VAR_period & (self.data['deriv1'] == row.minimum)][0]
-                # minimum within VAR period
-                else:
-                    min_search_period_end = VAR_period[::-1].idxmax()
-
-            plateau = self.data['soil_moisture'].loc[max_search_period_start:min_search_period_end]
-            if 'highest_sm' in self.data.columns:
-                if plateau.mean() > (
-                    self.data['highest_sm']
-                    .loc[max_search_period_start:min_search_period_end]
-                    .mean()
-                    * 0.95
-                ):
-                    index.extend(plateau.index)
-            else:  # if no highest_sm column then use highest_sm_value as threshold
-                if plateau.mean() > (highest_sm_value * 0.95):
-                    index.extend(plateau.index)
-
-        self.data['qflag'][index].apply(lambda x: x.add(tag))
+            maximum[self.column('d10_mask')[valid] > 0] = 99
+
+        for name, values in (('VAR', VAR), ('VAR_grouped', groups), ('maximum', maximum), ('minimum', minimum)):
+            self.add_diagnostic(name, values, valid)
+
+        # first maximum and last minimum of each group (skipping missing values like groupby first and last)
+        has_maximum = np.flatnonzero(~np.isnan(maximum))
+        rise_groups, first_maximum = np.unique(groups[has_maximum], return_index=True)
+        rise = np.round(maximum[has_maximum[first_maximum]], 3)
+        has_minimum = np.flatnonzero(~np.isnan(minimum))[::-1]
+        drop_groups, last_minimum = np.unique(groups[has_minimum], return_index=True)
+        drop = np.round(minimum[has_minimum[last_minimum]], 3)
+
+        # possible plateaus are groups with both a rise and a drop
+        rise_groups, rise = rise_groups[rise >= 0.25], rise[rise >= 0.25]
+        drop_groups, drop = drop_groups[drop < 0], drop[drop < 0]
+        possible_plateaus, rise_index, drop_index = np.intersect1d(rise_groups, drop_groups, return_indices=True)
+
+        # first and last position of the group of low variance of each possible plateau, the VAR period covers the
+        # group and the following 11 hours
+        group_ids, group_first = np.unique(groups, return_index=True)
+        group_last = len(groups) - 1 - np.unique(groups[::-1], return_index=True)[1]
+        group_index = np.searchsorted(group_ids, possible_plateaus)
+        first = group_first[group_index]
+        last = np.minimum(group_last[group_index] + 11, len(groups) - 1)
+
+        # Look for possible plateaus including both a soil moisture rise and drop within the VAR period: plateau
+        # starts at the max inside of VAR period (or at the beginning of VAR period if max lies outside) and ends at
+        # the min inside of VAR period (or at the end of VAR period if min lies outside)
+        rise_max, drop_min = rise[rise_index], drop[drop_index]
+        max_positions, min_positions = first_match(
+            deriv1, np.concatenate([rise_max, drop_min]), np.tile(first, 2), np.tile(last, 2)
+        ).reshape(2, -1)
+        if len(possible_plateaus) and possible_plateaus[0] == 0:
+            # other than the groups of low variance, the rows without low variance (group 0) are not consecutive and
+            # their VAR period only includes the rows up to 11 hours after one of them
+            VAR_slice = slice(first[0], last[0] + 1)
+            in_group = groups[VAR_slice] == 0
+            in_VAR_period = np.convolve(in_group, np.ones(12), 'full')[:len(in_group)] > 0
+            for positions, extreme in ((max_positions, rise_max[0]), (min_positions, drop_min[0])):
+                matches = np.flatnonzero(in_VAR_period & (deriv1[VAR_slice] == extreme))
+                positions[0] = first[0] + matches[0] if len(matches) else -1
+        max_search_period_start = np.where(max_positions >= 0, max_positions, first)
+        min_search_period_end = np.where(min_positions >= 0, min_positions, last)
+        ordered = min_search_period_end >= max_search_period_start
+        starts, ends = max_search_period_start[ordered], min_search_period_end[ordered] + 1
+
+        # mean soil moisture of all plateaus at once
+        if 'highest_sm' in self.data.columns:
+            threshold = window_mean(self.column('highest_sm')[valid], starts, ends) * 0.95
+        else:  # if no highest_sm column then use highest_sm_value as threshold
+            threshold = highest_sm_value * 0.95
+        plateaus = window_mean(sm, starts, ends) > threshold
+
+        # mark the rows from start to end of each plateau (+1 at the start and -1 after the end of each plateau)
+        covered = np.bincount(starts[plateaus], minlength=len(sm) + 1)
+        covered -= np.bincount(ends[plateaus], minlength=len(sm) + 1)
+        mask = np.zeros(len(valid), dtype=bool)
+        mask[valid] = np.cumsum(covered[:-1]) > 0
+
+        self.add_flag(mask, tag)
 
     def flag_G(self, tag):
         """
-        Applies tag for all unflagged observations
+        Applies tag for all unflagged observations (rows without a measurement are not flagged as good)
 
         Parameters
         ----------
         tag : string or int, optional
         code added to qflag-column when flag-criteria are met
         """
-        index_good = self.data[self.data['qflag'] == set()].index
-        self.data['qflag'][index_good].apply(lambda x: x.add(tag))
+        unflagged = (self.qflag == 0) & ~np.isnan(self.column(self.variable))
+        if unflagged.any():
+            self.add_flag(unflagged, tag)
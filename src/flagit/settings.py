@@ -9,6 +9,12 @@ class Variables():
 
     variable_list = ['soil_moisture','soil_temperature','air_temperature','precipitation',
                          'surface_temperature', 'soil_suction', 'snow_water_equivalent','snow_depth']
+
+    low_boundary_dict = {'soil_moisture': 0, 'soil_temperature': -60, 'air_temperature': -60, 'precipitation': 0,
+                         'surface_temperature': -60, 'soil_suction': 0, 'snow_water_equivalent': 0, 'snow_depth': 0}
+    hi_boundary_dict = {'soil_moisture': 60, 'soil_temperature': 60, 'air_temperature': 60, 'precipitation': 100,
+                        'surface_temperature': 60, 'soil_suction': 2500, 'snow_water_equivalent': 10000,
+                        'snow_depth': 10000}
     
     def low_boundary(self, var):
         """
@@ -24,10 +30,7 @@ class Variables():
         var : string
         variable name (some examples are:  soil_moisture, soil_temperature, snow_water_equivalent)
         """
-        low_boundary_dict = {'soil_moisture': 0, 'soil_temperature': -60, 'air_temperature': -60, 'precipitation': 0,
-                          'surface_temperature': -60, 'soil_suction': 0, 'snow_water_equivalent': 0, 'snow_depth':
-                          0}
-        return low_boundary_dict[var]
+        return self.low_boundary_dict[var]
         
     def hi_boundary(self, var):
         """
@@ -43,8 +46,5 @@ class Variables():
         var : string
         variable name (some examples are:  soil_moisture, soil_temperature, snow_water_equivalent)
         """
-        hi_boundary_dict = {'soil_moisture': 60, 'soil_temperature': 60, 'air_temperature': 60, 'precipitation': 100,
-                          'surface_temperature': 60, 'soil_suction': 2500, 'snow_water_equivalent': 10000, 
-                            'snow_depth': 10000}
-        return hi_boundary_dict[var]
+        return self.hi_boundary_dict[var]
         
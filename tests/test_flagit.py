@@ -1,19 +1,28 @@
 from flagit import flagit
 import numpy as np
 import pandas as pd
+from scipy.signal import savgol_coeffs, savgol_filter
 import os
 import unittest
+import warnings
 
 
 class TestInterface(unittest.TestCase):
-    def setUp(self):
+    @classmethod
+    def setUpClass(cls):
         """
-        Read pandas.DataFrame from CSV file and setting up of interface object
+        Read pandas.DataFrame from CSV file once for all tests
         """
-        self.ancillary_path = os.path.join(os.path.dirname(__file__))
+        cls.ancillary_path = os.path.join(os.path.dirname(__file__))
 
-        self.data = pd.read_csv(os.path.join(self.ancillary_path,
-                                                './test_data/test_dataframe.csv'), index_col='utc', parse_dates=True)
+        cls.test_data = pd.read_csv(os.path.join(cls.ancillary_path,
+                                                 './test_data/test_dataframe.csv'), index_col='utc', parse_dates=True)
+
+    def setUp(self):
+        """
+        Copy of the test data (qflag is reset by each interface) and setting up of interface object
+        """
+        self.data = self.test_data.copy()
 
         self.iface = flagit.Interface(data=self.data, sat_point=42.7, depth_from=0.09)
 
@@ -41,9 +50,104 @@ class TestInterface(unittest.TestCase):
         assert self.data.qflag[636] == {'G'}
         np.testing.assert_almost_equal(self.data.deriv1[58], -5.551115123125783e-17)
         np.testing.assert_almost_equal(self.data.deriv2[29], -6.200000000000003)
-        assert len(self.data.keys()) == 33
+        assert len(self.data.keys()) == 9
         assert type(self.data) == pd.DataFrame
-        assert len(self.data) == 695
+        assert len(self.data) == 696
+        assert np.isnan(self.data.soil_moisture.iloc[567])
+
+    def test_run_flags_copy_on_write(self) -> None:
+        """
+        Test that the flags are written to data with pandas Copy-on-Write enabled
+        """
+        with pd.option_context('mode.copy_on_write', True):
+            self.iface.run()
+        assert self.data.qflag[30] == {'C01', 'D01', 'D02', 'D03', 'D06'}
+        assert self.data.qflag[40] == {'D01', 'D02', 'D03', 'D07', 'D09'}
+        assert self.data.qflag[99] == {'C03', 'D01', 'D02', 'D03', 'D10'}
+        assert len(self.data) == 696
+
+    def test_run_flags_without_warnings(self) -> None:
+        """
+        Test that the flags are written to data without pandas warnings (e.g. SettingWithCopyWarning)
+        """
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            self.iface.run()
+        assert self.data.qflag[30] == {'C01', 'D01', 'D02', 'D03', 'D06'}
+
+    def test_run_flags_independent_sets(self) -> None:
+        """
+        Test that rows with the same flags do not share one set object in the qflag column
+        """
+        self.iface.run(name=['C01'])
+        assert self.data.qflag[31] == self.data.qflag[32] == set()
+        self.data.qflag[31].add('C02')
+        assert self.data.qflag[32] == set()
+
+    def test_run_diagnostics(self) -> None:
+        """
+        Test intermediate results of the flags added to data if requested
+        """
+        self.iface.run(diagnostics=True)
+        assert len(self.data.keys()) == 31
+        assert len(self.data) == 696
+        assert self.data.spike[30]
+        assert self.data.eq_new2.sum() == 0
+        assert self.data.end[40] == 1
+        assert self.data.VAR_grouped.max() > 0
+
+    def test_run_other_variable(self) -> None:
+        """
+        Test that only threshold flags are applied to variables other than soil moisture
+        """
+        data = pd.DataFrame(
+            {'soil_temperature': [-70.0, 1.0, 2.0, 70.0] * 10, 'air_temperature': [-1.0] * 40},
+            index=pd.date_range('2020-01-01', periods=40, freq='h'),
+        )
+        flagit.Interface(data).run()
+        assert data.qflag.iloc[0] == {'C01'}
+        assert data.qflag.iloc[1] == set()
+        assert data.qflag.iloc[3] == {'C02'}
+
+    def test_init_float64(self) -> None:
+        """
+        Test that columns the flags are computed on are converted to float64 with a warning
+        """
+        self.data['soil_moisture'] = self.data['soil_moisture'].astype(np.float32)
+        with self.assertWarns(UserWarning):
+            iface = flagit.Interface(data=self.data)
+        assert self.data['soil_moisture'].dtype == np.float64
+        assert np.shares_memory(iface.column('soil_moisture'), self.data['soil_moisture'].to_numpy())
+
+    def test_qflag_to_sets(self) -> None:
+        """
+        Test decoding of qflag bitmasks into sets of flag ids or flag numbers
+        """
+        qflag = np.array([0, flagit.flag_bit('C01') | flagit.flag_bit('G'), flagit.flag_bit(13)])
+        assert flagit.qflag_to_sets(qflag) == [set(), {'C01', 'G'}, {'D10'}]
+        assert flagit.qflag_to_sets(qflag, flag_numbers=True) == [set(), {1, 14}, {13}]
+        assert max(flagit.FLAG_BITS.values()) <= np.iinfo(flagit.QFLAG_DTYPE).max
+
+    def test_init_float64_int_object(self) -> None:
+        """
+        Test that integer and object columns are converted to float64 with a warning pointing to the caller
+        """
+        self.data['precipitation'] = self.data['precipitation'].fillna(0).astype(int)
+        self.data['soil_temperature'] = self.data['soil_temperature'].astype(object)
+        with self.assertWarns(UserWarning) as context:
+            flagit.Interface(data=self.data)
+        assert context.filename == __file__
+        assert self.data['precipitation'].dtype == np.float64
+        assert self.data['soil_temperature'].dtype == np.float64
+
+    def test_column(self) -> None:
+        """
+        Test that float64 columns are read as contiguous arrays without copy, once per run
+        """
+        sm = self.iface.column('soil_moisture')
+        assert sm.flags.c_contiguous
+        assert np.shares_memory(sm, self.data['soil_moisture'].to_numpy())
+        assert self.iface.column('soil_moisture') is sm
 
     def test_check_C01(self) -> None:
         """
@@ -110,6 +214,16 @@ class TestInterface(unittest.TestCase):
         assert self.data.qflag[70] == {'D05'}
         assert self.data.qflag[636] == set()
 
+    def test_check_D04_D05(self) -> None:
+        """
+        Test flags D04 and D05 applied together, sharing the soil moisture rise
+        """
+        self.iface.run(name=['D04', 'D05'])
+        assert 'soil_moisture_rise' in self.iface.arrays
+        assert self.data.qflag[70] == {'D04', 'D05'}
+        assert self.data.qflag[136] == {'D04', 'D05'}
+        assert self.data.qflag[71] == set()
+
     def test_check_D06(self) -> None:
         """
         Test flag D06
@@ -120,6 +234,142 @@ class TestInterface(unittest.TestCase):
         assert self.data.qflag[30] == {'D06'}
         assert self.data.qflag[29] == set()
 
+    def test_check_D06_relative_variance(self) -> None:
+        """
+        Test relative variance of D06: variance / mean of the 24 values from t-12 to t+12 hours without t
+        """
+        self.iface.run(name=['D06'], diagnostics=True)
+        sm = self.data.soil_moisture.to_numpy()
+        for t in (12, 30, 300):
+            window = np.delete(sm[t - 12:t + 13], 12)
+            np.testing.assert_almost_equal(self.data.eq6.iloc[t], np.var(window, ddof=1) / window.mean())
+
+    def test_check_D06_gap(self) -> None:
+        """
+        Test that the relative variance of D06 is not calculated for windows including a gap
+        """
+        self.data.iloc[50, self.data.columns.get_loc('soil_moisture')] = np.nan
+        self.iface.run(name=['D06'], diagnostics=True)
+        assert self.data.eq6.iloc[38:63].isna().all()
+        assert self.data.eq6.iloc[[37, 63]].notna().all()
+
+    def test_peaks(self) -> None:
+        """
+        Test positive and negative peaks of D06 lasting 1 hour (1) and 2 hours (2)
+        """
+        sm = np.array([1.0, 2.0, 1.0, 1.0, 3.0, 3.0, 1.0, 1.0])
+        np.testing.assert_array_equal(flagit.peaks(sm)[1:7], [1, 2, 0, 2, 0, 0])
+        assert np.isnan(flagit.peaks(sm)[-1])
+        assert np.isnan(flagit.peaks(np.array([1.0, 2.0, np.nan, np.nan, 1.0, 2.0]))[2])
+
+    def test_shift(self) -> None:
+        """
+        Test shifted values, equal to pandas.Series.shift
+        """
+        sm = self.data.soil_moisture.to_numpy()
+        for periods in (-24, -1, 0, 1, 24):
+            np.testing.assert_array_equal(flagit.shift(sm, periods), self.data.soil_moisture.shift(periods).to_numpy())
+
+    def test_rolling_extreme(self) -> None:
+        """
+        Test maximum and minimum of centered moving windows ignoring nan, equal to pandas rolling max and min
+        """
+        series = self.data.soil_moisture
+        maximum = series.rolling(25, center=True, min_periods=1).max().to_numpy()
+        minimum = series.rolling(25, center=True, min_periods=1).min().to_numpy()
+        np.testing.assert_array_equal(flagit.rolling_extreme(series.to_numpy(), 25), maximum)
+        np.testing.assert_array_equal(flagit.rolling_extreme(series.to_numpy(), 25, largest=False), minimum)
+
+    def test_diff(self) -> None:
+        """
+        Test differences to the value periods positions before, equal to pandas.Series.diff
+        """
+        sm = self.data.soil_moisture.to_numpy()
+        for periods in (1, 24):
+            np.testing.assert_array_equal(flagit.diff(sm, periods), self.data.soil_moisture.diff(periods).to_numpy())
+        assert np.isnan(flagit.diff(np.array([1.0, 2.0]), 24)).all()
+
+    def test_plateau_mask(self) -> None:
+        """
+        Test plateau mask of D09: cumulative sum of the sequence clipped to [0, 1] after each step
+        """
+        sequence = np.random.default_rng(0).choice([-1, 0, 1], size=200)
+        expected, state = [], 0
+        for value in sequence:
+            state = min(max(state + value, 0), 1)
+            expected.append(state)
+        np.testing.assert_array_equal(flagit.plateau_mask(sequence), expected)
+        np.testing.assert_array_equal(flagit.plateau_mask(np.array([0, -1, 1, 0, 1, -1, 0])), [0, 0, 1, 1, 1, 0, 0])
+        assert len(flagit.plateau_mask(np.array([]))) == 0
+
+    def test_renumber_plateaus(self) -> None:
+        """
+        Test consecutive numbering of possible plateaus of D10
+        """
+        np.testing.assert_array_equal(
+            flagit.renumber_plateaus(np.array([1, 0, 1, 1, 0, 0, 1, 1])), [1, 0, 2, 2, 0, 0, 3, 3]
+        )
+        np.testing.assert_array_equal(
+            flagit.renumber_plateaus(np.array([False, True, True, False, True])), [0, 1, 1, 0, 2]
+        )
+        assert len(flagit.renumber_plateaus(np.array([]))) == 0
+
+    def test_first_match(self) -> None:
+        """
+        Test first position within each range where the values equal the target of the range
+        """
+        values = np.array([1.0, 2.0, np.nan, 2.0, 1.0, 2.0])
+        targets = np.array([2.0, 2.0, 1.0, 3.0, np.nan, 2.0])
+        starts, ends = np.array([0, 2, 1, 0, 0, 4]), np.array([5, 5, 3, 5, 5, 4])
+        np.testing.assert_array_equal(flagit.first_match(values, targets, starts, ends), [1, 3, -1, -1, -1, -1])
+        assert len(flagit.first_match(np.array([np.nan]), np.array([]), np.array([]), np.array([]))) == 0
+
+    def test_window_mean(self) -> None:
+        """
+        Test means of overlapping windows, skipping missing values like pandas
+        """
+        values = np.array([1.0, 2.0, np.nan, 4.0, 5.0, np.nan])
+        starts, ends = np.array([0, 1, 3, 5]), np.array([2, 5, 5, 6])
+        expected = [pd.Series(values[a:b]).mean() for a, b in zip(starts, ends)]
+        np.testing.assert_array_equal(flagit.window_mean(values, starts, ends), expected)
+
+    def test_savgol_coeffs(self) -> None:
+        """
+        Test that the Savitzky-Golay coefficients equal those of scipy
+        """
+        np.testing.assert_array_equal(
+            flagit.SAVGOL_COEFFS, np.stack([savgol_coeffs(3, 2, deriv=1), savgol_coeffs(3, 2, deriv=2)])
+        )
+
+    def test_savgol_derivatives(self) -> None:
+        """
+        Test that the derivatives are identical to those of scipy.signal.savgol_filter
+        """
+        self.iface.apply_savgol()
+        sm = self.data.soil_moisture.to_numpy()
+        np.testing.assert_array_equal(self.data.deriv1, savgol_filter(sm, 3, 2, deriv=1, mode='nearest'))
+        np.testing.assert_array_equal(self.data.deriv2, savgol_filter(sm, 3, 2, deriv=2, mode='nearest'))
+
+    def test_savgol_finite_differences(self) -> None:
+        """
+        Test that the derivatives equal central finite differences of hourly soil moisture, repeating the edge values
+        (compared where the three values around t are not missing)
+        """
+        self.iface.apply_savgol()
+        sm = np.pad(self.data.soil_moisture.to_numpy(), 1, mode='edge')
+        valid = ~np.isnan(sm[2:] + sm[1:-1] + sm[:-2])
+        np.testing.assert_allclose(self.data.deriv1[valid], ((sm[2:] - sm[:-2]) / 2)[valid], atol=1e-12)
+        np.testing.assert_allclose(self.data.deriv2[valid], (sm[2:] - 2 * sm[1:-1] + sm[:-2])[valid], atol=1e-12)
+
+    def test_check_D06_without_run(self) -> None:
+        """
+        Test flag D06 applied outside of run, the derivatives are computed on demand
+        """
+        self.iface.flag_D06('D06')
+        assert self.iface.qflag[30] == flagit.flag_bit('D06')
+        assert self.iface.qflag[29] == 0
+        np.testing.assert_almost_equal(self.data.deriv2[29], -6.200000000000003)
+
     def test_check_D07_D08_D09(self) -> None:
         """
         Test flags D07, D08 and D09
@@ -131,6 +381,27 @@ class TestInterface(unittest.TestCase):
         assert self.data.qflag[41] == {'D09'}
         assert self.data.qflag[39] == set()
 
+    def test_check_D07_drop_to_zero(self) -> None:
+        """
+        Test flag D07 for a drop of soil moisture to zero
+        """
+        sm = [20.0 + 0.1 * (i % 3) for i in range(30)] + [0.0] * 20
+        data = pd.DataFrame({'soil_moisture': sm}, index=pd.date_range('2020-01-01', periods=50, freq='h'))
+        flagit.Interface(data).run(name=['D07'])
+        assert data.qflag.iloc[30] == {'D07'}
+        assert data.qflag.iloc[29] == set()
+        assert data.qflag.iloc[31] == set()
+
+    def test_check_D07_D08_D09_flag_numbers(self) -> None:
+        """
+        Test flags D07, D08 and D09 with flag numbers as tags
+        """
+        self.iface.run(name=[10, 12], flag_numbers=True)
+        assert self.data.qflag[40] == {10, 12}
+        assert self.data.qflag[80] == {11}
+        assert self.data.qflag[41] == {12}
+        assert self.data.qflag[39] == set()
+
     def test_check_D10(self) -> None:
         """
         Test flag D10
@@ -139,13 +410,56 @@ class TestInterface(unittest.TestCase):
         assert self.data.qflag[99] == {'D10'}
         assert self.data.qflag[75] == set()
 
+    def test_check_D10_highest_sm(self) -> None:
+        """
+        Test flag D10 with the threshold taken from a highest_sm column instead of the data
+        """
+        self.data['highest_sm'] = 100.0
+        flagit.Interface(data=self.data).run(name=['D10'])
+        assert self.data.qflag[99] == set()
+        self.data['highest_sm'] = 30.0
+        flagit.Interface(data=self.data).run(name=['D10'])
+        assert self.data.qflag[99] == {'D10'}
+
     def test_check_good(self) -> None:
         """
         Test flag "good"
         """
         self.iface.run(name=['G'])
         assert self.data.qflag[3] == {'G'}
-        assert len(np.unique(self.data.qflag)) == 1
+        assert len(np.unique(self.data.qflag[self.data.soil_moisture.notna()])) == 1
+
+    def test_check_good_missing_values(self) -> None:
+        """
+        Test that rows without soil moisture are not flagged as "good"
+        """
+        self.iface.run()
+        missing = self.data.soil_moisture.isna()
+        assert missing.any()
+        assert all('G' not in qflag for qflag in self.data.qflag[missing])
+
+        data = pd.DataFrame(
+            {'soil_moisture': [20.0, np.nan, np.nan, 20.5]}, index=pd.date_range('2020-01-01', periods=4, freq='h')
+        )
+        flagit.Interface(data).run(name=['G'])
+        assert list(data.qflag) == [{'G'}, set(), set(), {'G'}]
+
+    def test_check_good_after_flags(self) -> None:
+        """
+        Test that flag "good" is only applied to observations without any other flag
+        """
+        self.iface.run(name=['C01', 'G'])
+        assert self.data.qflag[30] == {'C01'}
+        assert self.data.qflag[31] == {'G'}
+        assert self.iface.qflag[30] & flagit.flag_bit('G') == 0
+
+    def test_check_good_all_flagged(self) -> None:
+        """
+        Test that flag "good" is not applied if all observations are flagged
+        """
+        data = pd.DataFrame({'soil_moisture': [-1.0] * 10}, index=pd.date_range('2020-01-01', periods=10, freq='h'))
+        flagit.Interface(data).run(name=['C01', 'G'])
+        assert all(qflag == {'C01'} for qflag in data.qflag)
 
 
 